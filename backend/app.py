@@ -1,27 +1,143 @@
 """Audio2MIDI Mini App — Backend API."""
 
+import asyncio
+import logging
+import os
 import re
-import base64
+import shutil
 import uuid
+from collections.abc import AsyncIterator, Iterable, Iterator
+from contextlib import asynccontextmanager
+from itertools import islice
 from pathlib import Path
+from typing import BinaryIO
+from urllib.parse import quote
 
-from fastapi import FastAPI, HTTPException, Header, Query, File, UploadFile, Form
+from fastapi import FastAPI, HTTPException, Header, Query, File, UploadFile, Form, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, Response
 from pydantic import BaseModel
+from starlette.types import ASGIApp, Receive, Scope, Send
+from watchfiles import Change, awatch
 
 from auth import validate_init_data
-from config import ADMIN_IDS, MIDI_DIR, CORS_ORIGINS
+from config import (
+    ADMIN_IDS,
+    MIDI_DIR,
+    CORS_ORIGINS,
+    CORS_ORIGIN_REGEX,
+    UPLOAD_MAX_CONCURRENCY,
+    UPLOAD_QUEUE_TIMEOUT,
+)
 
 # Directory for MIDI storage
 MIDI_PATH = Path(MIDI_DIR)
+MIDI_OUTPUT_PATH = MIDI_PATH / "output"
+MIDI_MINIAPP_PATH = MIDI_PATH / "miniapp"
+
+MIDI_SUFFIXES = (".mid", ".midi")
+
+# Lookup order, highest priority first: /api/midi/{filename} search dirs, and
+# (dir, suffix) probes for midi_id. The index ranks entries by the same order.
+MIDI_FILENAME_SEARCH_DIRS = (MIDI_PATH, MIDI_OUTPUT_PATH, MIDI_MINIAPP_PATH)
+MIDI_ID_SEARCH = (
+    (MIDI_PATH, ".mid"),
+    (MIDI_PATH, ".midi"),
+    (MIDI_PATH, ""),
+    (MIDI_MINIAPP_PATH, ".mid"),
+    (MIDI_OUTPUT_PATH, ".mid"),
+)
+
+# Characters stripped from midi_id (\w is Unicode-aware: uploads keep
+# non-ASCII names such as Cyrillic)
+_UNSAFE_MIDI_ID_CHARS = re.compile(r"[^\w\-.]")
+
+# Uploads are copied to disk in chunks of this size
+UPLOAD_CHUNK_SIZE = 1 << 20  # 1 MiB
+
+# MIDI files are immutable once uploaded (unique midi_id per upload)
+MIDI_CACHE_CONTROL = "public, max-age=3600"
+
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """Build the MIDI index at startup and watch MIDI_PATH while running."""
+    MIDI_PATH.mkdir(parents=True, exist_ok=True)
+    build_midi_index()
+    stop_event = asyncio.Event()
+    watcher = asyncio.create_task(watch_midi_dir(stop_event))
+    try:
+        yield
+    finally:
+        # Let awatch return on its own so its worker thread exits cleanly
+        stop_event.set()
+        await watcher
+
+
+app = FastAPI(title="Audio2MIDI Mini App API", version="1.0.0", lifespan=lifespan)
 
-app = FastAPI(title="Audio2MIDI Mini App API", version="1.0.0")
+
+# --- Upload admission control ---
+class UploadAdmissionMiddleware:
+    """
+    Bound concurrent requests to one path.
+    Runs before the body is read, so excess uploads wait here (up to
+    queue_timeout seconds, then 503) instead of all being spooled at once.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        path: str,
+        max_concurrency: int,
+        queue_timeout: float,
+    ) -> None:
+        self.app = app
+        self.path = path
+        self.queue_timeout = queue_timeout
+        self.slots = asyncio.Semaphore(max_concurrency)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (
+            scope["type"] != "http"
+            or scope["method"] != "POST"
+            or scope["path"] != self.path
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            await asyncio.wait_for(self.slots.acquire(), self.queue_timeout)
+        except TimeoutError:
+            response = JSONResponse(
+                status_code=503,
+                content={"detail": "Server busy, retry later"},
+                headers={"Retry-After": str(max(1, round(self.queue_timeout)))},
+            )
+            await response(scope, receive, send)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.slots.release()
+
+
+app.add_middleware(
+    UploadAdmissionMiddleware,
+    path="/api/upload-midi",
+    max_concurrency=UPLOAD_MAX_CONCURRENCY,
+    queue_timeout=UPLOAD_QUEUE_TIMEOUT,
+)
 
 # --- CORS ---
+# Added last so it wraps the admission middleware (503s keep CORS headers)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=CORS_ORIGINS,
+    allow_origin_regex=CORS_ORIGIN_REGEX,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
@@ -56,6 +172,201 @@ def extract_user_from_header(authorization: str | None) -> dict | None:
     return None
 
 
+# --- MIDI index ---
+# midi_id -> Path and filename -> Path, kept in sync with disk by a watcher.
+# Each index ranks entries like its fallback probes, so a hit is always the
+# file the probe order would have returned.
+_midi_id_index: dict[str, Path] = {}
+_midi_name_index: dict[str, Path] = {}
+
+
+def _id_rank(p: Path, midi_id: str) -> int | None:
+    """Position of p among the MIDI_ID_SEARCH probes for midi_id, if any."""
+    if p.suffix.lower() not in MIDI_SUFFIXES:
+        return None
+    for rank, (search_dir, suffix) in enumerate(MIDI_ID_SEARCH):
+        if p == search_dir / f"{midi_id}{suffix}":
+            return rank
+    return None
+
+
+def _name_rank(p: Path) -> int | None:
+    """Position of p's directory in MIDI_FILENAME_SEARCH_DIRS, if any."""
+    if p.suffix.lower() not in MIDI_SUFFIXES:
+        return None
+    try:
+        return MIDI_FILENAME_SEARCH_DIRS.index(p.parent)
+    except ValueError:
+        return None
+
+
+def index_midi(p: Path) -> None:
+    """Register a MIDI file unless a higher-priority file holds its keys."""
+    for midi_id in (p.stem, p.name):
+        rank = _id_rank(p, midi_id)
+        if rank is None:
+            continue
+        current = _midi_id_index.get(midi_id)
+        if current is None or rank <= _id_rank(current, midi_id):
+            _midi_id_index[midi_id] = p
+
+    rank = _name_rank(p)
+    if rank is not None:
+        current = _midi_name_index.get(p.name)
+        if current is None or rank <= _name_rank(current):
+            _midi_name_index[p.name] = p
+
+
+def unindex_midi(p: Path) -> None:
+    """Drop index entries pointing at a removed file."""
+    for midi_id in (p.stem, p.name):
+        if _midi_id_index.get(midi_id) == p:
+            del _midi_id_index[midi_id]
+    if _midi_name_index.get(p.name) == p:
+        del _midi_name_index[p.name]
+
+
+def build_midi_index() -> None:
+    """Scan the search directories once and rebuild both indexes."""
+    _midi_id_index.clear()
+    _midi_name_index.clear()
+    for d in MIDI_FILENAME_SEARCH_DIRS:
+        if not d.is_dir():
+            continue
+        for p in d.glob("*.mid*"):
+            if p.is_file():
+                index_midi(p)
+
+
+async def watch_midi_dir(stop_event: asyncio.Event) -> None:
+    """Keep the MIDI index in sync with files added or removed on disk."""
+    root = MIDI_PATH.resolve()
+    try:
+        async for changes in awatch(root, stop_event=stop_event):
+            for change, path in changes:
+                # Map back onto MIDI_PATH so entries match the search dirs
+                p = MIDI_PATH / Path(path).relative_to(root)
+                if change == Change.deleted:
+                    unindex_midi(p)
+                else:
+                    index_midi(p)
+    except Exception:
+        # e.g. inotify watch limit hit, or MIDI_PATH removed. Lookups keep
+        # working: misses and stale hits fall back to probing the search order.
+        logger.exception("MIDI index watcher stopped; relying on path probes")
+
+
+def sanitize_midi_id(midi_id: str) -> str:
+    """Strip everything but word characters, '-' and '.' from a midi_id."""
+    return _UNSAFE_MIDI_ID_CHARS.sub("", midi_id)
+
+
+def stat_if_exists(p: Path) -> os.stat_result | None:
+    """stat() p, or None if it does not exist."""
+    try:
+        return p.stat()
+    except FileNotFoundError:
+        return None
+
+
+def probe_midi(
+    indexed: Path | None, candidates: Iterable[Path]
+) -> tuple[Path, os.stat_result] | None:
+    """
+    Return the indexed path and its stat if it still exists, otherwise the
+    first existing MIDI candidate (which is indexed for next time). A stale
+    index entry (file removed before the watcher caught up) is dropped and
+    the candidates probed, so a lower-priority copy is still found.
+    """
+    if indexed:
+        st = stat_if_exists(indexed)
+        if st:
+            return indexed, st
+        unindex_midi(indexed)
+
+    for p in candidates:
+        if p.suffix.lower() not in MIDI_SUFFIXES:
+            continue
+        st = stat_if_exists(p)
+        if st:
+            index_midi(p)
+            return p, st
+    return None
+
+
+def find_midi_by_id(safe_id: str) -> tuple[Path, os.stat_result] | None:
+    """Resolve a sanitized midi_id to a MIDI file path and its stat."""
+    return probe_midi(
+        _midi_id_index.get(safe_id),
+        (search_dir / f"{safe_id}{suffix}" for search_dir, suffix in MIDI_ID_SEARCH),
+    )
+
+
+def find_midi_by_name(filename: str) -> tuple[Path, os.stat_result] | None:
+    """Resolve a MIDI filename to a path and its stat."""
+    return probe_midi(
+        _midi_name_index.get(filename),
+        (search_dir / filename for search_dir in MIDI_FILENAME_SEARCH_DIRS),
+    )
+
+
+def iter_midi_entries(root: str) -> Iterator[os.DirEntry]:
+    """
+    Recursively and lazily yield MIDI file entries under root.
+    Unreadable directories are skipped, as Path.rglob does.
+    """
+    try:
+        it = os.scandir(root)
+    except PermissionError:
+        return
+    with it:
+        for entry in it:
+            # is_dir() uses the d_type from readdir — no extra stat() call
+            if entry.is_dir(follow_symlinks=False):
+                yield from iter_midi_entries(entry.path)
+            elif entry.name.endswith(MIDI_SUFFIXES):
+                yield entry
+
+
+def save_upload(src: BinaryIO, dest: Path, header: bytes) -> int:
+    """Write header + the rest of src to dest in chunks; return bytes written."""
+    try:
+        with dest.open("wb") as out:
+            out.write(header)
+            shutil.copyfileobj(src, out, UPLOAD_CHUNK_SIZE)
+            return out.tell()
+    except BaseException:
+        dest.unlink(missing_ok=True)
+        raise
+
+
+def midi_file_response(
+    request: Request,
+    file_path: Path,
+    st: os.stat_result,
+    filename: str,
+    headers: dict[str, str] | None = None,
+) -> Response:
+    """Serve a MIDI file, answering 304 if the client's ETag still matches."""
+    etag = f'W/"{st.st_mtime_ns:x}-{st.st_size:x}"'
+    cache_headers = {"ETag": etag, "Cache-Control": MIDI_CACHE_CONTROL}
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        tags = {t.strip() for t in if_none_match.split(",")}
+        if "*" in tags or etag in tags:
+            return Response(status_code=304, headers=cache_headers)
+
+    # FileResponse handles Range itself (206 / 416) and sets Content-Length
+    return FileResponse(
+        path=str(file_path),
+        media_type="audio/midi",
+        filename=filename,
+        headers={**cache_headers, "Accept-Ranges": "bytes", **(headers or {})},
+        stat_result=st,
+    )
+
+
 # --- Endpoints ---
 
 @app.get("/api/health")
@@ -78,39 +389,33 @@ async def auth(req: AuthRequest):
 
 
 @app.get("/api/midi/{filename}")
-async def get_midi(filename: str, authorization: str | None = Header(None)):
+async def get_midi(
+    request: Request,
+    filename: str,
+    authorization: str | None = Header(None),
+):
     """Serve a MIDI file by filename."""
     # Security: prevent path traversal
     if ".." in filename or "/" in filename or "\\" in filename:
         raise HTTPException(status_code=400, detail="Invalid filename")
 
-    # Search for the MIDI file
-    search_dirs = [
-        MIDI_PATH,
-        MIDI_PATH / "output",
-        MIDI_PATH / "miniapp",
-    ]
-
-    for search_dir in search_dirs:
-        file_path = search_dir / filename
-        if file_path.exists() and file_path.suffix.lower() in (".mid", ".midi"):
-            return FileResponse(
-                path=str(file_path),
-                media_type="audio/midi",
-                filename=filename,
-            )
+    found = find_midi_by_name(filename)
+    if found:
+        file_path, st = found
+        return midi_file_response(request, file_path, st, filename)
 
     raise HTTPException(status_code=404, detail="MIDI file not found")
 
 
 @app.get("/api/latest-midi")
 async def get_latest_midi(
+    request: Request,
     midi_id: str | None = Query(None, description="MIDI file ID (filename without extension)"),
     authorization: str | None = Header(None),
 ):
     """
     Get MIDI file for piano roll visualization.
-    Returns base64-encoded MIDI data for frontend parsing.
+    Returns raw MIDI bytes; metadata is available via /api/midi-meta.
     """
     if not midi_id:
         return JSONResponse(
@@ -119,72 +424,66 @@ async def get_latest_midi(
         )
 
     # Sanitize midi_id to prevent path traversal
-    safe_id = re.sub(r'[^\w\-.]', '', midi_id)
+    safe_id = sanitize_midi_id(midi_id)
     if not safe_id:
         raise HTTPException(status_code=400, detail="Invalid midi_id")
-    
-    # Search in multiple locations
-    search_paths = [
-        MIDI_PATH / f"{safe_id}.mid",
-        MIDI_PATH / f"{safe_id}.midi",
-        MIDI_PATH / safe_id,
-        MIDI_PATH / "miniapp" / f"{safe_id}.mid",
-        MIDI_PATH / "output" / f"{safe_id}.mid",
-    ]
-    
-    midi_path = None
-    for p in search_paths:
-        if p.exists() and p.suffix.lower() in ('.mid', '.midi'):
-            midi_path = p
-            break
-    
-    if not midi_path:
+
+    found = find_midi_by_id(safe_id)
+    if not found:
         return JSONResponse(
             status_code=404,
-            content={
-                "ok": False,
-                "error": "MIDI file not found",
-                "searched": [str(p) for p in search_paths[:3]]
-            }
+            content={"ok": False, "error": "MIDI file not found"}
         )
+    midi_path, st = found
 
-    # Read and encode MIDI file
-    try:
-        midi_data = midi_path.read_bytes()
-        midi_b64 = base64.b64encode(midi_data).decode('ascii')
-        
-        return {
-            "ok": True,
-            "filename": midi_path.name,
-            "midi_id": safe_id,
-            "size": len(midi_data),
-            "data": midi_b64,
-        }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to read MIDI: {e}")
+    # Header values must be latin-1; midi_id may be non-ASCII (e.g. Cyrillic)
+    return midi_file_response(
+        request, midi_path, st, midi_path.name, headers={"X-MIDI-Id": quote(safe_id)}
+    )
+
+
+@app.get("/api/midi-meta")
+async def get_midi_meta(
+    midi_id: str | None = Query(None, description="MIDI file ID (filename without extension)"),
+):
+    """Return MIDI file metadata without the file body."""
+    if not midi_id:
+        return JSONResponse(
+            status_code=400,
+            content={"ok": False, "error": "midi_id is required"}
+        )
+
+    safe_id = sanitize_midi_id(midi_id)
+    if not safe_id:
+        raise HTTPException(status_code=400, detail="Invalid midi_id")
+
+    found = find_midi_by_id(safe_id)
+    if not found:
+        return JSONResponse(
+            status_code=404,
+            content={"ok": False, "error": "MIDI file not found"}
+        )
+    midi_path, st = found
+
+    return {
+        "ok": True,
+        "filename": midi_path.name,
+        "midi_id": safe_id,
+        "size": st.st_size,
+    }
 
 
 @app.get("/api/midi-file/{midi_id}")
-async def download_midi_file(midi_id: str):
+async def download_midi_file(request: Request, midi_id: str):
     """Download MIDI file directly (binary response)."""
-    safe_id = re.sub(r'[^\w\-.]', '', midi_id)
+    safe_id = sanitize_midi_id(midi_id)
     if not safe_id:
         raise HTTPException(status_code=400, detail="Invalid midi_id")
 
-    search_paths = [
-        MIDI_PATH / f"{safe_id}.mid",
-        MIDI_PATH / f"{safe_id}.midi",
-        MIDI_PATH / safe_id,
-        MIDI_PATH / "miniapp" / f"{safe_id}.mid",
-    ]
-
-    for p in search_paths:
-        if p.exists() and p.suffix.lower() in ('.mid', '.midi'):
-            return FileResponse(
-                path=str(p),
-                media_type="audio/midi",
-                filename=p.name,
-            )
+    found = find_midi_by_id(safe_id)
+    if found:
+        midi_path, st = found
+        return midi_file_response(request, midi_path, st, midi_path.name)
 
     raise HTTPException(status_code=404, detail="MIDI file not found")
 
@@ -209,21 +508,21 @@ async def upload_midi(
     # Ensure directory exists
     MIDI_PATH.mkdir(parents=True, exist_ok=True)
     
-    # Save file
-    file_path = MIDI_PATH / f"{midi_id}.mid"
-    content = await file.read()
-    
     # Basic validation - MIDI files start with "MThd"
-    if not content.startswith(b'MThd'):
+    header = await file.read(4)
+    if header != b'MThd':
         raise HTTPException(status_code=400, detail="Invalid MIDI file")
     
-    file_path.write_bytes(content)
+    # Save file: stream the rest to disk instead of reading it all into memory
+    file_path = MIDI_PATH / f"{midi_id}.mid"
+    size = await asyncio.to_thread(save_upload, file.file, file_path, header)
+    index_midi(file_path)
     
     return {
         "ok": True,
         "midi_id": midi_id,
         "filename": f"{midi_id}.mid",
-        "size": len(content),
+        "size": size,
         "user_id": user_id,
     }
 
@@ -238,12 +537,20 @@ async def list_midi_files(authorization: str | None = Header(None)):
     if not is_admin:
         raise HTTPException(status_code=403, detail="Admin access required")
 
-    files = []
-    for p in MIDI_PATH.rglob("*.mid"):
-        files.append({
-            "name": p.name,
-            "path": str(p.relative_to(MIDI_PATH)),
-            "size": p.stat().st_size
-        })
-    
-    return {"ok": True, "files": files[:100]}  # Limit to 100
+    def scan() -> list[dict]:
+        if not MIDI_PATH.is_dir():
+            return []
+        return [
+            {
+                "name": entry.name,
+                "path": os.path.relpath(entry.path, MIDI_PATH),
+                "size": entry.stat().st_size,
+            }
+            # Limit to 100 — the walk stops once the cap is reached
+            for entry in islice(iter_midi_entries(str(MIDI_PATH)), 100)
+        ]
+
+    # Directory walk + stat() per file — keep it off the event loop
+    files = await asyncio.to_thread(scan)
+
+    return {"ok": True, "files": files}
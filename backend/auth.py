@@ -1,14 +1,22 @@
 """Telegram Mini App initData validation (HMAC-SHA256)."""
 
-import hashlib
 import hmac
 import json
 import time
-from urllib.parse import parse_qs, unquote
+from urllib.parse import parse_qsl, unquote
 
 from config import BOT_TOKEN
 
 
+def _make_secret_key(bot_token: str) -> bytes:
+    """HMAC key: HMAC-SHA256 of bot token with "WebAppData" as key."""
+    return hmac.digest(b"WebAppData", bot_token.encode("utf-8"), "sha256")
+
+
+# BOT_TOKEN is fixed for the process — derive the secret key once
+_SECRET_KEY = _make_secret_key(BOT_TOKEN) if BOT_TOKEN else None
+
+
 def validate_init_data(init_data: str, bot_token: str = BOT_TOKEN) -> dict | None:
     """
     Validate Telegram WebApp initData string.
@@ -27,34 +35,20 @@ def validate_init_data(init_data: str, bot_token: str = BOT_TOKEN) -> dict | Non
         }
 
     try:
-        parsed = parse_qs(init_data, keep_blank_values=True)
-        # Each value is a list — take first element
-        data = {k: v[0] for k, v in parsed.items()}
+        data = {}
+        for k, v in parse_qsl(init_data, keep_blank_values=True):
+            # First occurrence wins (same as parse_qs(...)[k][0])
+            data.setdefault(k, v)
     except Exception:
         return None
 
+    # Cheap rejections before any HMAC work: hash must be 64 hex chars
+    # (ASCII also keeps compare_digest from raising TypeError)
     received_hash = data.pop("hash", None)
-    if not received_hash:
+    if not received_hash or len(received_hash) != 64 or not received_hash.isascii():
         return None
 
-    # Build check string: sorted key=value pairs separated by \n
-    check_items = sorted(data.items())
-    check_string = "\n".join(f"{k}={v}" for k, v in check_items)
-
-    # HMAC key: HMAC-SHA256 of bot token with "WebAppData" as key
-    secret_key = hmac.new(
-        b"WebAppData", bot_token.encode("utf-8"), hashlib.sha256
-    ).digest()
-
-    # Calculate hash
-    calculated_hash = hmac.new(
-        secret_key, check_string.encode("utf-8"), hashlib.sha256
-    ).hexdigest()
-
-    if not hmac.compare_digest(calculated_hash, received_hash):
-        return None
-
-    # Optionally check auth_date freshness (allow 24h)
+    # Check auth_date freshness (allow 24h)
     auth_date = data.get("auth_date")
     if auth_date:
         try:
@@ -63,6 +57,22 @@ def validate_init_data(init_data: str, bot_token: str = BOT_TOKEN) -> dict | Non
         except ValueError:
             pass
 
+    # Build check string: sorted key=value pairs separated by \n
+    # (UTF-8 byte order matches code point order, so sorting bytes is safe)
+    check_items = sorted((k.encode("utf-8"), v.encode("utf-8")) for k, v in data.items())
+    check_bytes = b"\n".join(k + b"=" + v for k, v in check_items)
+
+    if bot_token == BOT_TOKEN:
+        secret_key = _SECRET_KEY
+    else:
+        secret_key = _make_secret_key(bot_token)
+
+    # Calculate hash (hmac.digest uses OpenSSL's one-shot HMAC path)
+    calculated_hash = hmac.digest(secret_key, check_bytes, "sha256").hex()
+
+    if not hmac.compare_digest(calculated_hash, received_hash):
+        return None
+
     # Parse user JSON
     user_data = data.get("user")
     if user_data:
@@ -23,8 +23,16 @@ CORS_ORIGINS = [
     "http://localhost:5173",
     "http://127.0.0.1:3000",
     "http://127.0.0.1:5173",
-    "https://*.ngrok-free.app",
-    "https://*.ngrok.io",
 ]
 
+# ngrok tunnels (CORSMiddleware matches allow_origins literally, so wildcard
+# subdomains must go through allow_origin_regex)
+CORS_ORIGIN_REGEX = r"https://[a-z0-9-]+\.(ngrok-free\.app|ngrok\.io)"
+
 CACHE_TTL_SECONDS = 300  # 5 minutes
+
+# Admission control for /api/upload-midi (applied before the body is read):
+# max in-flight uploads, and how long extra requests may queue (seconds)
+# before getting 503
+UPLOAD_MAX_CONCURRENCY = int(os.getenv("UPLOAD_MAX_CONCURRENCY", "4"))
+UPLOAD_QUEUE_TIMEOUT = float(os.getenv("UPLOAD_QUEUE_TIMEOUT", "5"))
@@ -0,0 +1,47 @@
+"""Shared fixtures: point the app at a throwaway MIDI_DIR before import."""
+
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# config.py reads env at import time — set it before the app is imported
+_MIDI_ROOT = Path(tempfile.mkdtemp(prefix="a2m-midi-"))
+os.environ["MIDI_DIR"] = str(_MIDI_ROOT)
+os.environ["BOT_TOKEN"] = ""
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+import app as app_module  # noqa: E402
+
+
+@pytest.fixture(scope="session", autouse=True)
+def _remove_midi_root():
+    yield
+    shutil.rmtree(_MIDI_ROOT, ignore_errors=True)
+
+
+@pytest.fixture(autouse=True)
+def _isolate_midi_dir():
+    # Each test starts with an empty MIDI_DIR and index
+    yield
+    for entry in _MIDI_ROOT.iterdir():
+        if entry.is_dir():
+            shutil.rmtree(entry)
+        else:
+            entry.unlink()
+    app_module._midi_id_index.clear()
+    app_module._midi_name_index.clear()
+
+
+@pytest.fixture
+def midi_dir() -> Path:
+    return app_module.MIDI_PATH
+
+
+@pytest.fixture
+def client():
+    with TestClient(app_module.app) as c:
+        yield c
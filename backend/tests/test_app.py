@@ -0,0 +1,187 @@
+"""API tests for MIDI upload and retrieval."""
+
+import asyncio
+import os
+from urllib.parse import unquote
+
+from fastapi.testclient import TestClient
+from starlette.responses import PlainTextResponse
+
+import app as app_module
+from app import UploadAdmissionMiddleware
+
+MIDI_BYTES = b"MThd\x00\x00\x00\x06\x00\x00\x00\x01\x00\x60"
+
+
+def upload(client, filename: str, content: bytes = MIDI_BYTES) -> dict:
+    response = client.post("/api/upload-midi", files={"file": (filename, content)})
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_latest_midi_with_non_ascii_id(client):
+    midi_id = upload(client, "тест.mid")["midi_id"]
+    assert midi_id.startswith("тест_")
+
+    response = client.get("/api/latest-midi", params={"midi_id": midi_id})
+
+    assert response.status_code == 200
+    assert response.content == MIDI_BYTES
+    assert unquote(response.headers["X-MIDI-Id"]) == midi_id
+
+
+def test_midi_meta_stale_index_entry_is_404(client, midi_dir):
+    uploaded = upload(client, "stale.mid")
+    # Delete behind the watcher's back, then hit the endpoint immediately
+    (midi_dir / uploaded["filename"]).unlink()
+
+    response = client.get("/api/midi-meta", params={"midi_id": uploaded["midi_id"]})
+
+    assert response.status_code == 404
+
+
+def test_stale_index_entry_falls_back_to_lower_priority_copy(midi_dir):
+    (midi_dir / "miniapp").mkdir(exist_ok=True)
+    (midi_dir / "x.mid").write_bytes(MIDI_BYTES + b"root")
+    (midi_dir / "miniapp" / "x.mid").write_bytes(MIDI_BYTES + b"miniapp")
+
+    with TestClient(app_module.app) as client:
+        # Indexed at startup; delete the preferred copy behind the watcher's back
+        (midi_dir / "x.mid").unlink()
+        by_id = client.get("/api/midi-file/x")
+        by_name = client.get("/api/midi/x.mid")
+
+    assert by_id.content == MIDI_BYTES + b"miniapp"
+    assert by_name.content == MIDI_BYTES + b"miniapp"
+
+
+def test_matching_etag_is_304_with_cache_headers(client):
+    midi_id = upload(client, "cached.mid")["midi_id"]
+    first = client.get(f"/api/midi-file/{midi_id}")
+    etag = first.headers["ETag"]
+
+    response = client.get(
+        f"/api/midi-file/{midi_id}", headers={"If-None-Match": f'"other", {etag}'}
+    )
+
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["ETag"] == etag
+    assert response.headers["Cache-Control"] == app_module.MIDI_CACHE_CONTROL
+
+
+def test_wildcard_if_none_match_is_304(client):
+    midi_id = upload(client, "wildcard.mid")["midi_id"]
+
+    response = client.get(f"/api/midi-file/{midi_id}", headers={"If-None-Match": "*"})
+
+    assert response.status_code == 304
+    assert response.content == b""
+
+
+def test_range_request_is_206(client):
+    midi_id = upload(client, "ranged.mid")["midi_id"]
+
+    response = client.get(f"/api/midi-file/{midi_id}", headers={"Range": "bytes=0-3"})
+
+    assert response.status_code == 206
+    assert response.content == b"MThd"
+    assert response.headers["Accept-Ranges"] == "bytes"
+    assert response.headers["Content-Range"] == f"bytes 0-3/{len(MIDI_BYTES)}"
+
+
+def test_upload_admission_rejects_before_reading_body():
+    async def scenario():
+        entered = asyncio.Event()
+        release = asyncio.Event()
+        body_reads = []
+
+        async def inner(scope, receive, send):
+            await receive()
+            entered.set()
+            await release.wait()
+            await PlainTextResponse("ok")(scope, receive, send)
+
+        async def receive():
+            body_reads.append(True)
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        def sender(messages):
+            async def send(message):
+                messages.append(message)
+            return send
+
+        middleware = UploadAdmissionMiddleware(
+            inner, path="/api/upload-midi", max_concurrency=1, queue_timeout=0.05
+        )
+        scope = {"type": "http", "method": "POST", "path": "/api/upload-midi", "headers": []}
+
+        first_sent, second_sent = [], []
+        first = asyncio.create_task(middleware(scope, receive, sender(first_sent)))
+        await entered.wait()
+
+        # Slot is taken: the second upload is rejected without its body being read
+        await middleware(scope, receive, sender(second_sent))
+        assert second_sent[0]["status"] == 503
+        assert len(body_reads) == 1
+
+        release.set()
+        await first
+        assert first_sent[0]["status"] == 200
+
+    asyncio.run(asyncio.wait_for(scenario(), timeout=5))
+
+
+def test_index_follows_search_order_per_lookup(midi_dir):
+    # Filename lookup searches output/ before miniapp/; midi_id lookup the reverse
+    for sub in ("output", "miniapp"):
+        (midi_dir / sub).mkdir(exist_ok=True)
+        (midi_dir / sub / "dup.mid").write_bytes(MIDI_BYTES + sub.encode())
+
+    with TestClient(app_module.app) as client:
+        by_name = client.get("/api/midi/dup.mid")
+        by_id = client.get("/api/midi-file/dup")
+
+    assert by_name.content == MIDI_BYTES + b"output"
+    assert by_id.content == MIDI_BYTES + b"miniapp"
+
+
+def test_watcher_failure_is_logged_and_lookups_still_work(monkeypatch, caplog, midi_dir):
+    async def broken_awatch(*args, **kwargs):
+        raise OSError("inotify watch limit reached")
+        yield
+
+    monkeypatch.setattr(app_module, "awatch", broken_awatch)
+
+    with TestClient(app_module.app) as client:
+        # Added after startup and never seen by the watcher: found by probing
+        (midi_dir / "late.mid").write_bytes(MIDI_BYTES)
+        response = client.get("/api/midi-file/late")
+
+    assert response.status_code == 200
+    assert "MIDI index watcher stopped" in caplog.text
+
+
+def test_list_skips_unreadable_directories(monkeypatch, midi_dir):
+    (midi_dir / "locked").mkdir(exist_ok=True)
+    (midi_dir / "locked" / "hidden.mid").write_bytes(MIDI_BYTES)
+    (midi_dir / "visible.mid").write_bytes(MIDI_BYTES)
+
+    real_scandir = os.scandir
+
+    def scandir(path):
+        if os.path.basename(path) == "locked":
+            raise PermissionError(13, "Permission denied", path)
+        return real_scandir(path)
+
+    monkeypatch.setattr(os, "scandir", scandir)
+    admin_id = next(iter(app_module.ADMIN_IDS))
+    monkeypatch.setattr(app_module, "extract_user_from_header", lambda _: {"id": admin_id})
+
+    with TestClient(app_module.app) as client:
+        response = client.get("/api/list")
+
+    assert response.status_code == 200
+    names = {f["name"] for f in response.json()["files"]}
+    assert "visible.mid" in names
+    assert "hidden.mid" not in names
@@ -0,0 +1,73 @@
+"""Tests for Telegram initData validation."""
+
+import hashlib
+import hmac
+import json
+import time
+from urllib.parse import urlencode
+
+import pytest
+
+import auth
+
+BOT_TOKEN = "123456:TEST-token"
+USER = {"id": 42, "first_name": "Test"}
+
+
+def sign(fields: dict, bot_token: str = BOT_TOKEN) -> str:
+    """Build initData signed the way Telegram does."""
+    check_string = "\n".join(f"{k}={v}" for k, v in sorted(fields.items()))
+    secret_key = hmac.new(b"WebAppData", bot_token.encode(), hashlib.sha256).digest()
+    digest = hmac.new(secret_key, check_string.encode(), hashlib.sha256).hexdigest()
+    return urlencode({**fields, "hash": digest})
+
+
+def fields(**overrides) -> dict:
+    return {
+        "auth_date": str(int(time.time())),
+        "query_id": "AAE",
+        "user": json.dumps(USER),
+        **overrides,
+    }
+
+
+def test_valid_init_data_returns_user():
+    result = auth.validate_init_data(sign(fields()), bot_token=BOT_TOKEN)
+
+    assert result is not None
+    assert result["user"] == USER
+    assert result["query_id"] == "AAE"
+
+
+@pytest.mark.parametrize("bad_hash", ["abc123", "z" * 64, "é" * 64])
+def test_malformed_hash_is_rejected(bad_hash):
+    init_data = urlencode({**fields(), "hash": bad_hash})
+
+    assert auth.validate_init_data(init_data, bot_token=BOT_TOKEN) is None
+
+
+def test_expired_auth_date_is_rejected():
+    stale = str(int(time.time()) - 86400 - 60)
+
+    assert auth.validate_init_data(sign(fields(auth_date=stale)), bot_token=BOT_TOKEN) is None
+
+
+def test_duplicate_key_uses_first_value():
+    # Signed over the first user; a repeated key later on must not replace it
+    init_data = sign(fields()) + "&" + urlencode({"user": json.dumps({"id": 1})})
+
+    result = auth.validate_init_data(init_data, bot_token=BOT_TOKEN)
+
+    assert result is not None
+    assert result["user"] == USER
+
+
+def test_non_default_bot_token_derives_its_own_key(monkeypatch):
+    # The process-wide token has a cached key; another token must not reuse it
+    monkeypatch.setattr(auth, "BOT_TOKEN", "999:process-token")
+    monkeypatch.setattr(auth, "_SECRET_KEY", auth._make_secret_key("999:process-token"))
+
+    assert auth.validate_init_data(sign(fields()), bot_token=BOT_TOKEN) is not None
+    assert auth.validate_init_data(
+        sign(fields(), bot_token="999:process-token"), bot_token=BOT_TOKEN
+    ) is None
@@ -58,11 +58,10 @@ async function handleResponse<T>(response: Response): Promise<T> {
   return response.json() as Promise<T>;
 }
 
-/** GET request with optional query params. */
-export async function get<T>(
-  path: string,
-  params?: Record<string, string | number | boolean | undefined>,
-): Promise<T> {
+type QueryParams = Record<string, string | number | boolean | undefined>;
+
+/** Build an absolute API URL with optional query params. */
+function buildUrl(path: string, params?: QueryParams): string {
   const url = new URL(`${BASE_URL}${path}`, window.location.origin);
   if (params) {
     for (const [key, value] of Object.entries(params)) {
@@ -71,13 +70,37 @@ export async function get<T>(
       }
     }
   }
-  const response = await fetch(url.toString(), {
+  return url.toString();
+}
+
+/** GET request with optional query params. */
+export async function get<T>(path: string, params?: QueryParams): Promise<T> {
+  const response = await fetch(buildUrl(path, params), {
     method: 'GET',
     headers: buildHeaders(),
   });
   return handleResponse<T>(response);
 }
 
+/** Binary GET response: raw body + response headers. */
+export interface BinaryResponse {
+  data: ArrayBuffer;
+  headers: Headers;
+}
+
+/** GET request returning the raw response body as an ArrayBuffer. */
+export async function getBinary(path: string, params?: QueryParams): Promise<BinaryResponse> {
+  const response = await fetch(buildUrl(path, params), {
+    method: 'GET',
+    headers: buildHeaders(),
+  });
+  if (!response.ok) {
+    // Reuse JSON error parsing for non-2xx
+    await handleResponse<never>(response);
+  }
+  return { data: await response.arrayBuffer(), headers: response.headers };
+}
+
 /** POST request with JSON or FormData body. */
 export async function post<T>(
   path: string,
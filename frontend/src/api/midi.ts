@@ -2,15 +2,32 @@
  * Typed API functions for MIDI operations.
  */
 
-import { get, post } from './client';
-import type { MidiResponse, UploadResponse, HealthResponse, ListResponse } from './types';
+import { get, getBinary, post } from './client';
+import type { MidiFile, UploadResponse, HealthResponse, ListResponse } from './types';
+
+/** Extract filename from a Content-Disposition header. */
+function parseFilename(disposition: string | null): string | null {
+  if (!disposition) return null;
+  const encoded = /filename\*=utf-8''([^;]+)/i.exec(disposition);
+  if (encoded) return decodeURIComponent(encoded[1]);
+  const plain = /filename="?([^";]+)"?/i.exec(disposition);
+  return plain ? plain[1] : null;
+}
 
 /**
  * Fetch a MIDI file by its ID.
- * Returns base64-encoded MIDI data + metadata.
+ * Returns raw MIDI bytes + filename.
  */
-export async function fetchLatestMidi(midiId: string): Promise<MidiResponse> {
-  return get<MidiResponse>('/latest-midi', { midi_id: midiId });
+export async function fetchLatestMidi(midiId: string): Promise<MidiFile> {
+  const { data, headers } = await getBinary('/latest-midi', { midi_id: midiId });
+  // X-MIDI-Id is percent-encoded (header values must be latin-1)
+  const encodedId = headers.get('X-MIDI-Id');
+  const id = encodedId ? decodeURIComponent(encodedId) : midiId;
+  return {
+    data,
+    midi_id: id,
+    filename: parseFilename(headers.get('Content-Disposition')) ?? `${id}.mid`,
+  };
 }
 
 /**
@@ -5,13 +5,19 @@ export interface ApiResponse<T = unknown> {
   data?: T;
 }
 
-/** Response from GET /api/latest-midi */
-export interface MidiResponse {
+/** Raw MIDI file from GET /api/latest-midi */
+export interface MidiFile {
+  filename: string;
+  midi_id: string;
+  data: ArrayBuffer; // raw MIDI bytes
+}
+
+/** Response from GET /api/midi-meta */
+export interface MidiMetaResponse {
   ok: boolean;
   filename: string;
   midi_id: string;
   size: number;
-  data: string; // base64-encoded MIDI bytes
   error?: string;
 }
 
@@ -192,20 +192,13 @@ const PianoRoll: React.FC<PianoRollProps> = ({ midiParam, fileUrl, userId, initD
           loadMidi(buffer, decodeURIComponent(urlFilename))
         } else if (midiParam) {
           // Backend API mode (midi_id via ?midi= param)
-          const data = await fetchLatestMidi(midiParam)
+          const midi = await fetchLatestMidi(midiParam)
           
-          if (!data.ok || !data.data) {
-            throw new Error(data.error || 'No MIDI data received')
+          if (midi.data.byteLength === 0) {
+            throw new Error('No MIDI data received')
           }
           
-          // Decode base64 MIDI data
-          const binaryString = atob(data.data)
-          const bytes = new Uint8Array(binaryString.length)
-          for (let i = 0; i < binaryString.length; i++) {
-            bytes[i] = binaryString.charCodeAt(i)
-          }
-          
-          loadMidi(bytes.buffer, data.filename || `${midiParam}.mid`)
+          loadMidi(midi.data, midi.filename || `${midiParam}.mid`)
         }
       } catch (err) {
         if (err instanceof ApiError && err.status === 404) {